@@ -2,20 +2,40 @@
 
 import argparse
 import asyncio
+import concurrent.futures
 from dataclasses import dataclass
 from enum import Enum
-import json
+import errno
+import itertools
+import mmap
 import os
-import os.path
 from pathlib import Path
-import shlex
-import subprocess
+import random
+import stat
 import sys
-from typing import List
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Iterator, List
 
+import aiofiles
+import aiohttp
 from bioblend.galaxy import GalaxyInstance
+import orjson
 from tqdm import tqdm
-import yaml
+
+
+UPLOAD_CHUNK_SIZE = 2 << 20  # 2 MiB
+DETECTION_WORKERS = 8  # threads reading file headers ahead of the uploads
+FILE_QUEUE_SIZE = 1000
+IGNORED_WALK_ERRNOS = (errno.ENOENT, errno.ENOTDIR, errno.EBADF, errno.ELOOP)
+WALK_BATCH_SIZE = 100  # files found per trip to the thread walking the datasets directory
+KEEPALIVE_TIMEOUT = 300  # seconds an idle connection to Galaxy is kept open for reuse
+CONNECT_TIMEOUT = 30
+READ_TIMEOUT = 600  # seconds to wait for Galaxy to send (more of) a response
+RETRY_ATTEMPTS = 5
+RETRY_MAX_INTERVAL = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# a POST that got one of these was refused before Galaxy acted on it, so it can't have created a dataset
+POST_RETRY_STATUSES = (429, 503)
+TERMINAL_DATASET_STATES = ('ok', 'empty', 'error', 'discarded', 'failed_metadata')
 
 
 class CompressionType(Enum):
@@ -24,11 +44,29 @@ class CompressionType(Enum):
     NONE = 3
 
 
+COMPRESSION_BY_EXTENSION = {
+    '.gz': CompressionType.GZIP,
+    '.bz2': CompressionType.BZIP2,
+    '.fastq': CompressionType.NONE,
+    '.fq': CompressionType.NONE,
+}
+
+FORMAT_BY_COMPRESSION = {
+    CompressionType.GZIP: 'fastqsanger.gz',
+    CompressionType.BZIP2: 'fastqsanger.bz2',
+    CompressionType.NONE: 'fastqsanger',
+}
+
+
 # taken from https://stackoverflow.com/questions/11415570/directory-path-types-with-argparse
 class readable_dir(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         prospective_dir = values
-        if not os.path.isdir(prospective_dir):
+        try:
+            is_dir = stat.S_ISDIR(os.stat(prospective_dir).st_mode)
+        except OSError:
+            is_dir = False
+        if not is_dir:
             raise argparse.ArgumentError(self, "readable_dir:{0} is not a valid path".format(prospective_dir))
         if os.access(prospective_dir, os.R_OK):
             setattr(namespace, self.dest, prospective_dir)
@@ -36,12 +74,11 @@ class readable_dir(argparse.Action):
             raise argparse.ArgumentError(self, "readable_dir:{0} is not a readable dir".format(prospective_dir))
 
 
-def safe_run(cmd_str: str, function_name: str) -> subprocess.CompletedProcess:
-    cmd = shlex.split(cmd_str)
-    proc = subprocess.run(cmd, capture_output=True)
-    if proc.returncode:
-        raise OSError(f"{function_name} failed: cmd_str {cmd_str} return code: {proc.returncode} stderr: {proc.stderr.decode('utf-8')}\n\nstdout: {proc.stdout.decode('utf-8')}")
-    return proc
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+    return number
 
 
 def create_library(name: str, gi: GalaxyInstance) -> str:
@@ -50,15 +87,236 @@ def create_library(name: str, gi: GalaxyInstance) -> str:
     return library_id
 
 
-def detect_compression(path: Path) -> CompressionType:
-    if path.open('rb').read(2) == b'\x1f\x8b':
+def detect_compression(path: Path, trust_extension: bool = False) -> CompressionType:
+    if trust_extension:
+        compression_type = COMPRESSION_BY_EXTENSION.get(path.suffix.lower())
+        if compression_type is not None:
+            return compression_type
+    with path.open('rb') as fastq_file:
+        try:
+            with mmap.mmap(fastq_file.fileno(), 4, access=mmap.ACCESS_READ) as header_map:
+                header = header_map[:4]
+        except (ValueError, OSError):
+            # files shorter than the header can't be mapped, nor can files on some filesystems (e.g. FUSE
+            # mounts using direct_io), so read the header instead
+            header = fastq_file.read(4)
+    if header[:2] == b'\x1f\x8b':
         return CompressionType.GZIP
-    elif path.open('rb').read(3) == b'BZh':
+    elif header[:3] == b'BZh':
         return CompressionType.BZIP2
     else:
         return CompressionType.NONE
 
 
+async def read_chunks(path: Path, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, 'rb') as fastq_file:
+        while True:
+            chunk = await fastq_file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class GalaxyAsyncClient(object):
+    """Asynchronous client for the Galaxy library API calls made for each uploaded dataset.
+
+    All requests share a single aiohttp session, so connections to Galaxy are reused across uploads.
+    Files are streamed to Galaxy in chunks of chunk_size bytes rather than being read into memory.
+    At most num_rename_requests dataset polls and renames are in flight at once, so that they never
+    hold the connections needed by the num_upload_workers uploads.
+    """
+
+    def __init__(self, url: str, key: str, num_upload_workers: int, num_rename_requests: int,
+                 chunk_size: int = UPLOAD_CHUNK_SIZE) -> None:
+        if chunk_size <= 0:
+            # read(0) would send every file as empty, read(-1) would load whole files into memory
+            raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+        self.url = url.rstrip('/')
+        self.chunk_size = chunk_size
+        # keep idle connections open long enough to span the wait between rename batches,
+        # so that uploads and renames don't pay for a new TLS handshake
+        connector = aiohttp.TCPConnector(limit=num_upload_workers + num_rename_requests,
+                                         keepalive_timeout=KEEPALIVE_TIMEOUT)
+        self.rename_semaphore = asyncio.Semaphore(num_rename_requests)
+        # no limit on the total time of a request: streaming a large fastq file can take far longer than
+        # aiohttp's default of 5 minutes, so only connecting and waiting for Galaxy to respond are limited
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers={'x-api-key': key})
+
+    async def __aenter__(self) -> 'GalaxyAsyncClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+
+    async def _request(self, method: str, path: str, make_data: Callable[[], Any] = None, **kwargs) -> Any:
+        attempt = 1
+        while True:
+            if make_data is not None:
+                # a streamed request body is used up by a failed attempt, so build a new one each time
+                kwargs['data'] = make_data()
+            try:
+                async with self.session.request(method, f'{self.url}/api/{path}', **kwargs) as response:
+                    response.raise_for_status()
+                    return orjson.loads(await response.read())
+            except aiohttp.ClientResponseError as e:
+                retry_statuses = POST_RETRY_STATUSES if method == 'POST' else RETRY_STATUSES
+                if e.status not in retry_statuses or attempt == RETRY_ATTEMPTS:
+                    raise
+            except aiohttp.ClientConnectorError:
+                # the connection was never made, so nothing was sent
+                if attempt == RETRY_ATTEMPTS:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # Galaxy may already have stored an upload that failed part way, and re-sending it would
+                # leave a duplicate dataset in the library, so only retry requests that are safe to repeat
+                if method == 'POST' or attempt == RETRY_ATTEMPTS:
+                    raise
+            # back off exponentially, adding jitter so that workers that failed together don't retry together
+            await asyncio.sleep(min(2 ** (attempt - 1), RETRY_MAX_INTERVAL) + random.random())
+            attempt += 1
+
+    async def get_root_folder_id(self, library_id: str) -> str:
+        library_details = await self._request('GET', f'libraries/{library_id}')
+        return library_details['root_folder_id']
+
+    async def upload_file_from_local_path(self, library_id: str, folder_id: str, path: Path,
+                                          file_type: str, dbkey: str) -> List[dict]:
+        bodies: List[AsyncGenerator[bytes, None]] = []
+
+        def make_multipart() -> aiohttp.FormData:
+            body = read_chunks(path, self.chunk_size)
+            bodies.append(body)
+            multipart = aiohttp.FormData()
+            multipart.add_field('folder_id', folder_id)
+            multipart.add_field('create_type', 'file')
+            multipart.add_field('upload_option', 'upload_file')
+            multipart.add_field('file_type', file_type)
+            multipart.add_field('dbkey', dbkey)
+            multipart.add_field('files_0|file_data', body, filename=path.name)
+            return multipart
+        try:
+            return await self._request('POST', f'libraries/{library_id}/contents', make_data=make_multipart)
+        finally:
+            # an upload that failed or was cancelled part way leaves its body suspended with the file still open
+            for body in bodies:
+                await body.aclose()
+
+    async def show_library_dataset(self, library_id: str, dataset_id: str) -> dict:
+        async with self.rename_semaphore:
+            return await self._request('GET', f'libraries/{library_id}/contents/{dataset_id}')
+
+    async def update_library_dataset(self, dataset_id: str, name: str) -> dict:
+        async with self.rename_semaphore:
+            return await self._request('PATCH', f'libraries/datasets/{dataset_id}', json={'name': name})
+
+
+class TaskScope(object):
+    """Minimal stand-in for asyncio.TaskGroup (Python 3.11+).
+
+    When any task in the scope fails, all the other tasks are cancelled. Leaving the scope waits for every
+    task, including ones started while waiting, and then re-raises the first failure.
+    """
+
+    def __init__(self) -> None:
+        self.tasks: List[asyncio.Task] = []
+        self.error: BaseException = None
+        self.cancelled = False
+
+    async def __aenter__(self) -> 'TaskScope':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.cancel()
+        try:
+            # running tasks can start new ones (upload workers start rename batches), so wait until all are done
+            while not all(task.done() for task in self.tasks):
+                await asyncio.wait(self.tasks)
+        except asyncio.CancelledError:
+            self.cancel()
+            # let the cancelled tasks unwind before anything they use (e.g. the client session) is closed
+            await asyncio.wait(self.tasks)
+            raise
+        if self.error is not None and exc_type is None:
+            raise self.error
+
+    def create_task(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(self._task_done)
+        self.tasks.append(task)
+        if self.cancelled:
+            task.cancel()
+        return task
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for task in self.tasks:
+            task.cancel()
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None and self.error is None:
+            self.error = task.exception()
+            self.cancel()
+
+
+async def gather_in_scope(*aws) -> list:
+    """Like asyncio.gather(), but a failure cancels and waits for the other awaitables rather than leaving them
+    running"""
+    async with TaskScope() as scope:
+        tasks = [scope.create_task(aw) for aw in aws]
+    return [task.result() for task in tasks]
+
+
+def is_ignorable_walk_error(error: OSError) -> bool:
+    # the errors Path.glob() skips over rather than failing the whole walk
+    return isinstance(error, PermissionError) or error.errno in IGNORED_WALK_ERRNOS
+
+
+def find_fastq_files(path: str) -> Iterator[Path]:
+    # equivalent to Path(path).glob('**/*.fastq*') but files are yielded as they are found and
+    # os.scandir() gets the file type from the directory listing, saving a stat() per file.
+    # Like glob, directories and entries that can't be read are skipped.
+    try:
+        entries = os.scandir(path)
+    except OSError as e:
+        if not is_ignorable_walk_error(e):
+            raise
+        return
+    with entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir() and not entry.is_symlink()
+                is_fastq = not is_dir and '.fastq' in entry.name and entry.is_file()
+            except OSError as e:
+                if not is_ignorable_walk_error(e):
+                    raise
+                continue
+            if is_dir:
+                yield from find_fastq_files(entry.path)
+            elif is_fastq:
+                yield Path(entry.path)
+
+
+async def queue_fastq_files(datasets_path: Path, queue: asyncio.Queue, num_consumers: int,
+                            pool: concurrent.futures.Executor, trust_extensions: bool = False) -> None:
+    loop = asyncio.get_running_loop()
+    fastq_files = find_fastq_files(str(datasets_path))
+    while True:
+        # readdir() and the stat() that scandir falls back on when the filesystem doesn't report file
+        # types can block for a long time on network filesystems, so walk in a thread, a batch at a time
+        batch = await loop.run_in_executor(None, list, itertools.islice(fastq_files, WALK_BATCH_SIZE))
+        if not batch:
+            break
+        for fastq_file in batch:
+            # start reading the file header in the thread pool now, so that the compression type is
+            # usually known by the time an upload worker takes the file off the queue
+            compression_type = loop.run_in_executor(pool, detect_compression, fastq_file, trust_extensions)
+            await queue.put((fastq_file, compression_type))
+    for _ in range(num_consumers):
+        await queue.put(None)
+
+
 @dataclass
 class rename_info:
     library_id: str
@@ -66,58 +324,142 @@ class rename_info:
     new_name: str
 
 
-async def dataset_renamer(queue: asyncio.Queue, gi: GalaxyInstance) -> None:
+async def rename_datasets(batch: List[rename_info], client: GalaxyAsyncClient, semaphore: asyncio.Semaphore,
+                          failed: List[rename_info], max_interval: float = 30, maxwait: float = 12000) -> None:
+    async with semaphore:
+        pending = {info.dataset_id: info for info in batch}
+        interval = 1.0
+        waited = 0.0
+        while True:
+            # check the state of every dataset still pending in one round of requests, then rename those
+            # that Galaxy has finished processing (they can't be renamed before that)
+            polled = list(pending.values())
+            details = await gather_in_scope(*[client.show_library_dataset(info.library_id, info.dataset_id)
+                                              for info in polled])
+            ready = []
+            for info, dataset_details in zip(polled, details):
+                state = dataset_details['state']
+                if state in TERMINAL_DATASET_STATES:
+                    del pending[info.dataset_id]
+                    if state not in ('ok', 'empty'):
+                        # still rename it, so that the failed sample can be identified in the library
+                        failed.append(info)
+                    ready.append(info)
+            await gather_in_scope(*[client.update_library_dataset(info.dataset_id, name=info.new_name)
+                                    for info in ready])
+            if not pending:
+                break
+            if waited >= maxwait:
+                raise IOError(f'{len(pending)} datasets still not processed by Galaxy after {maxwait} seconds')
+            # back off exponentially, adding jitter so that concurrent batches don't poll in lockstep
+            delay = interval + random.uniform(0, interval / 2)
+            await asyncio.sleep(delay)
+            waited += delay
+            interval = min(interval * 2, max_interval)
+
+
+class RenameBatcher(object):
+    """Collects uploaded datasets and starts a rename_datasets() task in scope for each full batch"""
+
+    def __init__(self, client: GalaxyAsyncClient, batch_size: int, num_workers: int, scope: TaskScope) -> None:
+        self.client = client
+        self.scope = scope
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(num_workers)
+        self.batch: List[rename_info] = []
+        self.failed: List[rename_info] = []
+
+    def add(self, info: rename_info) -> None:
+        self.batch.append(info)
+        if len(self.batch) == self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.batch:
+            self.scope.create_task(rename_datasets(self.batch, self.client, self.semaphore, self.failed))
+            self.batch = []
+
+
+async def upload_dataset(fastq_file: Path, compression_type: CompressionType, library_id: str, folder_id: str,
+                         dbkey: str, client: GalaxyAsyncClient) -> rename_info:
+    format = FORMAT_BY_COMPRESSION[compression_type]
+    upload_details = await client.upload_file_from_local_path(library_id, folder_id, fastq_file,
+                                                              file_type=format, dbkey=dbkey)
+    dataset_name = fastq_file.name.partition('.fastq')[0]  # strip everything from .fastq onwards
+    # return from a successful upload is a single item list
+    # like:
+    #
+    # [
+    #    {
+    #     "url": "/api/libraries/33b43b4e7093c91f/contents/c24141d7e4e77705",
+    #     "name": "SRR1165236_1.fastq.gz",
+    #     "id": "c24141d7e4e77705"
+    #     }
+    # ]
+    upload_dataset_id = upload_details[0]['id']
+    return rename_info(library_id, upload_dataset_id, dataset_name)
+
+
+async def upload_worker(queue: asyncio.Queue, library_id: str, folder_id: str, dbkey: str,
+                        client: GalaxyAsyncClient, renamer: RenameBatcher, progress: tqdm) -> None:
     while True:
-        (info) = await queue.get()
-        # wait for Galaxy to process it before renaming it
-        gi.libraries.wait_for_dataset(info.library_id, info.dataset_id)
-        gi.libraries.update_library_dataset(info.dataset_id, name=info.new_name)
-        queue.task_done()
+        item = await queue.get()
+        if item is None:
+            break
+        fastq_file, compression_type = item
+        renamer.add(await upload_dataset(fastq_file, await compression_type, library_id, folder_id, dbkey, client))
+        progress.update()
 
 
-async def upload_datasets(datasets_path: Path, library_name: str, dbkey: str, gi: GalaxyInstance, num_workers: int = 2) -> None:
-    queue = asyncio.Queue()
-    workers = [asyncio.create_task(dataset_renamer(queue, gi)) for _ in range(num_workers)]
+async def upload_datasets(datasets_path: Path, library_name: str, dbkey: str, gi: GalaxyInstance,
+                          num_workers: int = 2, num_upload_workers: int = 4, rename_batch_size: int = 50,
+                          trust_extensions: bool = False, upload_chunk_size: int = UPLOAD_CHUNK_SIZE) -> None:
     if not datasets_path.exists() or not datasets_path.is_dir():
         raise IOError(f'path {datasets_path} must be a directory')
     library_id = create_library(library_name, gi)
-    fastq_file: Path  # add type hint for fastq_file, it is a Path
-    fastq_filenames: List[Path] = list(datasets_path.glob('**/*.fastq*'))
-    for fastq_file in tqdm(fastq_filenames):
-        compression_type = detect_compression(fastq_file)
-        if compression_type == CompressionType.GZIP:
-            format = 'fastqsanger.gz'
-        elif compression_type == CompressionType.BZIP2:
-            format = 'fastqsanger.bz2'
-        elif compression_type == CompressionType.NONE:
-            format = 'fastqsanger'
-        else:
-            raise ValueError(f'Unknown compression type {compression_type}')
-        upload_details = gi.libraries.upload_file_from_local_path(library_id, fastq_file, file_type=format, dbkey=dbkey)
-        dataset_name = fastq_file.name
-        fastq_pos = dataset_name.find('.fastq')
-        dataset_name = dataset_name[:fastq_pos]  # strip everything from .fastq onwards
-        # return from a successful upload is a single item list
-        # like:
-        #
-        # [
-        #    {
-        #     "url": "/api/libraries/33b43b4e7093c91f/contents/c24141d7e4e77705",
-        #     "name": "SRR1165236_1.fastq.gz",
-        #     "id": "c24141d7e4e77705"
-        #     }
-        # ]
-        upload_dataset_id = upload_details[0]['id']
-        await queue.put(rename_info(library_id, upload_dataset_id, dataset_name))
-    print("waiting on renaming to finish")
-    await queue.join()
-    for worker in workers:
-        worker.cancel()
+    async with GalaxyAsyncClient(gi.base_url, gi.key, num_upload_workers, num_workers,
+                                 upload_chunk_size) as client:
+        folder_id = await client.get_root_folder_id(library_id)
+        queue = asyncio.Queue(maxsize=FILE_QUEUE_SIZE)
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=DETECTION_WORKERS)
+        try:
+            with tqdm(unit='file') as progress:
+                # a failed upload or rename cancels everything else in the scope
+                async with TaskScope() as scope:
+                    renamer = RenameBatcher(client, rename_batch_size, num_workers, scope)
+                    scope.create_task(queue_fastq_files(datasets_path, queue, num_upload_workers, pool,
+                                                        trust_extensions))
+                    workers = [scope.create_task(upload_worker(queue, library_id, folder_id, dbkey, client, renamer,
+                                                               progress))
+                               for _ in range(num_upload_workers)]
+                    await asyncio.wait(workers)
+                    if scope.error is None:
+                        progress.close()
+                        print("waiting on renaming to finish")
+                        renamer.flush()
+        finally:
+            # after a failure, header reads for files still on the queue are no longer needed, and waiting for
+            # them in ThreadPoolExecutor.shutdown() would block the event loop
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    compression_type = item[1]
+                    if compression_type.done() and not compression_type.cancelled():
+                        # a header read that already failed can't be cancelled, so mark its error as seen
+                        # rather than have asyncio log it as never retrieved
+                        compression_type.exception()
+                    else:
+                        compression_type.cancel()
+            pool.shutdown(wait=False)
+    for info in renamer.failed:
+        print(f'warning: Galaxy failed to process dataset {info.new_name} ({info.dataset_id})', file=sys.stderr)
     # no need to return anything when we are done uploading
 
 
 def get_galaxy_instance(args: argparse.Namespace) -> GalaxyInstance:
     if args.parsec_galaxy_instance:
+        # only needed to read the parsec config, so don't pay for importing it when --galaxy_url is used
+        import yaml
         parsec_config_path = Path(Path.home(), '.parsec.yml')
         if not parsec_config_path.exists() or not parsec_config_path.is_file():
             raise IOError(f'parsec config file {parsec_config_path} not found')
@@ -143,7 +485,13 @@ if __name__ == '__main__':
     parser.add_argument('--parsec_galaxy_instance', help='Galaxy instance in parsec configuration to load access details from (use "default" for default instance')
     parser.add_argument('--galaxy_url', help='URL of Galaxy storage')
     parser.add_argument('--galaxy_key', help='Galaxy API key')
-    parser.add_argument('--num_renaming_workers', type=int, default=4, help='Number of worker processes for the renaming step')
+    parser.add_argument('--num_upload_workers', type=positive_int, default=4, help='Number of concurrent uploads')
+    parser.add_argument('--num_renaming_workers', type=positive_int, default=4, help='Number of batches of datasets to rename concurrently')
+    parser.add_argument('--rename_batch_size', type=positive_int, default=50, help='Number of uploaded datasets to rename together')
+    parser.add_argument('--upload_chunk_size', type=positive_int, default=UPLOAD_CHUNK_SIZE,
+                        help='Size in bytes of the chunks files are streamed to Galaxy in')
+    parser.add_argument('--trust_extensions', action='store_true', default=False,
+                        help='Detect compression from file extensions (.gz, .bz2, .fastq, .fq) instead of reading file headers')
     parser.add_argument('library_name', help='Library name to create')
     parser.add_argument('datasets_path', action=readable_dir, help='Directory path containing fastq files to upload')
     args = parser.parse_args()
@@ -158,4 +506,6 @@ if __name__ == '__main__':
         print('Either --parsec_galaxy_instance or both --galaxy_url and --galaxy_key must be supplied')
         sys.exit(1)
     gi = get_galaxy_instance(args)
-    asyncio.run(upload_datasets(Path(args.datasets_path), args.library_name, args.dbkey, gi, num_workers=args.num_renaming_workers))
+    asyncio.run(upload_datasets(Path(args.datasets_path), args.library_name, args.dbkey, gi, num_workers=args.num_renaming_workers,
+                                num_upload_workers=args.num_upload_workers, rename_batch_size=args.rename_batch_size,
+                                trust_extensions=args.trust_extensions, upload_chunk_size=args.upload_chunk_size))
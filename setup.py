@@ -27,7 +27,10 @@ setup(
     keywords='bioinformatics galaxy',
     classifiers=classifiers,
     install_requires=[
+        'aiofiles>=0.4.0',
+        'aiohttp>=3.6.0',
         'bioblend>=0.12.0',
+        'orjson>=2.0.0',
         'PyYAML>=5.1.1',
         'tqdm>=4.32.2'
     ]